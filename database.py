@@ -1,29 +1,102 @@
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import Column, Computed, Integer, String, event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from asyncio import current_task
 import os
 
-DATABASE_URL = "sqlite:///./data/directory.db"
+DATABASE_URL = "sqlite+aiosqlite:///./data/directory.db"
 
 # Ensure data directory exists
-os.makedirs(os.path.dirname(DATABASE_URL.replace("sqlite:///", "")), exist_ok=True)
+os.makedirs(os.path.dirname(DATABASE_URL.replace("sqlite+aiosqlite:///", "")), exist_ok=True)
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+# Sized pool instead of the defaults (5 + 10 overflow), which can be
+# exhausted under modest concurrency. StaticPool is not used: concurrent
+# async sessions sharing one connection would interleave transactions.
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+)
+
+# WAL lets readers proceed while a writer holds the database
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+# One session per asyncio task (i.e. per request), released with
+# SessionLocal.remove()
+SessionLocal = async_scoped_session(
+    async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession),
+    scopefunc=current_task,
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Lowercased name/department/job_title, so a substring search is one
+# LIKE per row instead of three case-insensitive ones
+SEARCH_BLOB_SQL = "lower(name || ' ' || department || ' ' || job_title)"
+
 class Employee(Base):
     __tablename__ = "employees"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
-    department = Column(String, index=True)
+    department = Column(String)
     email = Column(String, unique=True, index=True)
     phone = Column(String)
     job_title = Column(String)
+    search_blob = Column(String, Computed(SEARCH_BLOB_SQL))
+
+# Full-text index over the searchable columns, kept in sync with
+# `employees` by triggers (FTS5 external-content table)
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+        name, department, job_title,
+        content='employees', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS employees_ai AFTER INSERT ON employees BEGIN
+        INSERT INTO employees_fts(rowid, name, department, job_title)
+        VALUES (new.id, new.name, new.department, new.job_title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS employees_ad AFTER DELETE ON employees BEGIN
+        INSERT INTO employees_fts(employees_fts, rowid, name, department, job_title)
+        VALUES ('delete', old.id, old.name, old.department, old.job_title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS employees_au AFTER UPDATE ON employees BEGIN
+        INSERT INTO employees_fts(employees_fts, rowid, name, department, job_title)
+        VALUES ('delete', old.id, old.name, old.department, old.job_title);
+        INSERT INTO employees_fts(rowid, name, department, job_title)
+        VALUES (new.id, new.name, new.department, new.job_title);
+    END""",
+]
+
+# Indexes from earlier schemas that no query uses; search goes through
+# employees_fts and the primary key is already the rowid
+DEAD_INDEXES = ["ix_employees_id", "ix_employees_department"]
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        columns = (await conn.execute(text("PRAGMA table_xinfo(employees)"))).all()
+        if "search_blob" not in {column.name for column in columns}:
+            await conn.execute(text(
+                f"ALTER TABLE employees ADD COLUMN search_blob VARCHAR "
+                f"GENERATED ALWAYS AS ({SEARCH_BLOB_SQL}) VIRTUAL"
+            ))
+        fts_exists = (await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='employees_fts'")
+        )).first()
+        for ddl in FTS_DDL:
+            await conn.execute(text(ddl))
+        for index in DEAD_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        if not fts_exists:
+            # Index rows that were inserted before the FTS table existed
+            await conn.execute(text("INSERT INTO employees_fts(employees_fts) VALUES ('rebuild')"))
@@ -1,147 +1,263 @@
 import uvicorn
-from fastapi import FastAPI, Request, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, Query, status
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from starlette.middleware.sessions import SessionMiddleware
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
+from urllib.parse import urlencode
 import bcrypt
+import hashlib
+import os
+import re
+import time
 
 from database import SessionLocal, engine, Employee, init_db
+from sessions import ServerSessionMiddleware
 
-# Initialize Database
-init_db()
+app = FastAPI(default_response_class=ORJSONResponse)
 
-app = FastAPI()
+# Mount static files. Behind a reverse proxy, set SERVE_STATIC=0 and let
+# the proxy serve /static with sendfile(2) instead of copying through Python.
+if os.environ.get("SERVE_STATIC", "1") != "0":
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Templates (no reload checks per render, compiled bytecode cached on disk)
+os.makedirs(".jinja_cache", exist_ok=True)
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=select_autoescape(),
+    auto_reload=False,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(".jinja_cache"),
+))
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# The login page has no per-request data, only the two variants below,
+# so render both once
+LOGIN_HTML = templates.get_template("login.html").render(error=None)
+LOGIN_ERROR_HTML = templates.get_template("login.html").render(error="Invalid credentials")
 
-# Session Middleware (Secret key should be env var in prod)
-app.add_middleware(SessionMiddleware, secret_key="super-secret-key-change-me")
+# Session Middleware (sessions are kept in process memory, run a single worker)
+app.add_middleware(ServerSessionMiddleware)
+
+# Compress rendered pages
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Redirects are identical on every hit, so share one instance of each.
+# Middleware must not mutate their headers in place (Starlette's
+# MutableHeaders(scope=...) copies the list before changing it).
+REDIRECT_LOGIN = RedirectResponse(url="/login", status_code=303)
+REDIRECT_DIRECTORY = RedirectResponse(url="/directory", status_code=303)
 
 # Dependency
-def get_db():
-    db = SessionLocal()
+async def get_db():
     try:
-        yield db
+        yield SessionLocal()
     finally:
-        db.close()
+        await SessionLocal.remove()
 
-# Hardcoded Users (using bcrypt to hash passwords for demo consistency, 
-# though we are just comparing against hardcoded strings in this simple example,
-# the requirement asked to use bcrypt. 
-# Since users are hardcoded, I will pre-calculate the hash for "password123" 
-# to demonstrate verification or just do it on the fly for simplicity since it's hardcoded.)
-# Actually, the requirement says "Login page — simple username/password with 2 hardcoded users".
-# It also says "Use bcrypt directly". I will simulate a proper check.
+# Hardcoded Users. Password hashes are precomputed so importing the app
+# doesn't run bcrypt:
+# bcrypt.hashpw(b"adminpass", bcrypt.gensalt(rounds=12))
+# bcrypt.hashpw(b"userpass", bcrypt.gensalt(rounds=12))
 
-# Generating a hash for "password"
-# hashed = bcrypt.hashpw("password".encode('utf-8'), bcrypt.gensalt())
-# For simplicity in this demo, I'll just store the plain text in the hardcoded dict
-# and hash the input to verify against a stored hash, OR better yet, store the hash.
-
-ADMIN_HASH = bcrypt.hashpw("adminpass".encode('utf-8'), bcrypt.gensalt())
-USER_HASH = bcrypt.hashpw("userpass".encode('utf-8'), bcrypt.gensalt())
+ADMIN_HASH = b"$2b$12$zMdkxCNUM2YZaUh.ZhJqzObBPVWCkd0GQnD9wmWUdITx/kVGn/cPS"
+USER_HASH = b"$2b$12$9MTqRIzBz/ChqkPqdBZPnOjx0C5Mcr4HmnPNyeqaGNehzS0MSwFpy"
 
 USERS = {
     "admin": {"password_hash": ADMIN_HASH, "role": "admin", "name": "System Administrator"},
     "employee": {"password_hash": USER_HASH, "role": "employee", "name": "John Doe"},
 }
+# Bound once so the per-request lookup is a single call
+_USERS_GET = USERS.get
+
+# Directory ETag inputs. APP_VERSION changes with every deploy (process
+# start), so browsers never keep markup from an older template; the
+# directory version is bumped whenever an employee is added. Both live in
+# process memory, like the sessions.
+APP_VERSION = str(time.time_ns())
+directory_version = 0
 
 # Seeding
-def seed_data(db: Session):
-    if db.query(Employee).count() == 0:
+async def seed_data(db: AsyncSession):
+    if await db.scalar(select(Employee.id).limit(1)) is None:
         employees = [
-            Employee(name="Alice Smith", department="Engineering", email="alice@company.com", phone="555-0101", job_title="Senior Engineer"),
-            Employee(name="Bob Jones", department="Engineering", email="bob@company.com", phone="555-0102", job_title="Software Developer"),
-            Employee(name="Charlie Brown", department="HR", email="charlie@company.com", phone="555-0103", job_title="HR Manager"),
-            Employee(name="David Wilson", department="Sales", email="david@company.com", phone="555-0104", job_title="Sales Director"),
-            Employee(name="Eve Davis", department="Engineering", email="eve@company.com", phone="555-0105", job_title="DevOps Engineer"),
-            Employee(name="Frank Miller", department="Sales", email="frank@company.com", phone="555-0106", job_title="Account Executive"),
-            Employee(name="Grace Lee", department="HR", email="grace@company.com", phone="555-0107", job_title="Recruiter"),
-            Employee(name="Hank Green", department="Engineering", email="hank@company.com", phone="555-0108", job_title="QA Engineer"),
-            Employee(name="Ivy White", department="Marketing", email="ivy@company.com", phone="555-0109", job_title="Marketing Lead"),
-            Employee(name="Jack Black", department="Marketing", email="jack@company.com", phone="555-0110", job_title="Content Creator"),
+            {"name": "Alice Smith", "department": "Engineering", "email": "alice@company.com", "phone": "555-0101", "job_title": "Senior Engineer"},
+            {"name": "Bob Jones", "department": "Engineering", "email": "bob@company.com", "phone": "555-0102", "job_title": "Software Developer"},
+            {"name": "Charlie Brown", "department": "HR", "email": "charlie@company.com", "phone": "555-0103", "job_title": "HR Manager"},
+            {"name": "David Wilson", "department": "Sales", "email": "david@company.com", "phone": "555-0104", "job_title": "Sales Director"},
+            {"name": "Eve Davis", "department": "Engineering", "email": "eve@company.com", "phone": "555-0105", "job_title": "DevOps Engineer"},
+            {"name": "Frank Miller", "department": "Sales", "email": "frank@company.com", "phone": "555-0106", "job_title": "Account Executive"},
+            {"name": "Grace Lee", "department": "HR", "email": "grace@company.com", "phone": "555-0107", "job_title": "Recruiter"},
+            {"name": "Hank Green", "department": "Engineering", "email": "hank@company.com", "phone": "555-0108", "job_title": "QA Engineer"},
+            {"name": "Ivy White", "department": "Marketing", "email": "ivy@company.com", "phone": "555-0109", "job_title": "Marketing Lead"},
+            {"name": "Jack Black", "department": "Marketing", "email": "jack@company.com", "phone": "555-0110", "job_title": "Content Creator"},
         ]
-        db.add_all(employees)
-        db.commit()
+        # One executemany, skipping per-object unit-of-work bookkeeping
+        await db.execute(insert(Employee), employees)
+        await db.commit()
 
-# Run seed on startup
+# Initialize Database and run seed on startup
 @app.on_event("startup")
-def on_startup():
-    with SessionLocal() as db:
-        seed_data(db)
+async def on_startup():
+    global directory_version
+    # Compile every template up front instead of on its first request
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+    await init_db()
+    db = SessionLocal()
+    try:
+        await seed_data(db)
+        directory_version = await db.scalar(select(func.max(Employee.id))) or 0
+    finally:
+        await SessionLocal.remove()
+
+# Close pooled connections so aiosqlite's worker threads let the process exit
+@app.on_event("shutdown")
+async def on_shutdown():
+    await engine.dispose()
 
-# Helper to get current user from session
-def get_current_user(request: Request):
-    user_id = request.session.get("user")
-    if user_id and user_id in USERS:
-        return USERS[user_id]
-    return None
+# Dependencies to get current user from session. FastAPI caches them
+# per request, so the session is only read once; they are async so
+# FastAPI calls them inline instead of through the threadpool.
+async def get_current_user(request: Request) -> Optional[dict]:
+    return _USERS_GET(request.session.get("user"))
+
+async def require_user(user: Optional[dict] = Depends(get_current_user)) -> dict:
+    if not user:
+        raise HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": "/login"})
+    return user
+
+async def require_admin(user: Optional[dict] = Depends(get_current_user)) -> dict:
+    if not user or user["role"] != "admin":
+        raise HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": "/directory"})
+    return user
+
+# Helper to turn a free-text search into an FTS5 prefix query.
+# Every token is quoted so FTS5 operators (e.g. a leading "-") are
+# treated as plain text. Tokens are letters and digits only, since the
+# unicode61 tokenizer treats "_" as a separator.
+def fts_query(q: str) -> Optional[str]:
+    tokens = re.findall(r"[^\W_]+", q)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+# Columns rendered by directory.html (plus id for paging); rows come
+# back as lightweight tuples instead of ORM instances
+LISTING_COLUMNS = (
+    Employee.id, Employee.name, Employee.job_title,
+    Employee.department, Employee.email, Employee.phone,
+)
+
+FTS_SEARCH = text(
+    "SELECT e.id, e.name, e.job_title, e.department, e.email, e.phone "
+    "FROM employees e JOIN employees_fts f ON f.rowid = e.id "
+    "WHERE employees_fts MATCH :q ORDER BY rank LIMIT :limit OFFSET :offset"
+)
 
 @app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    user = get_current_user(request)
+async def root(user: Optional[dict] = Depends(get_current_user)):
     if user:
-        return RedirectResponse(url="/directory", status_code=303)
-    return RedirectResponse(url="/login", status_code=303)
+        return REDIRECT_DIRECTORY
+    return REDIRECT_LOGIN
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request, "error": None})
+async def login_page():
+    return HTMLResponse(LOGIN_HTML)
 
 @app.post("/login", response_class=HTMLResponse)
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     user = USERS.get(username)
     if not user:
-         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+         return HTMLResponse(LOGIN_ERROR_HTML)
     
-    # Verify password
-    if bcrypt.checkpw(password.encode('utf-8'), user["password_hash"]):
-        request.session["user"] = username
-        return RedirectResponse(url="/directory", status_code=303)
+    # Verify password (bcrypt is deliberately slow, keep it off the event loop)
+    if await run_in_threadpool(bcrypt.checkpw, password.encode('utf-8'), user["password_hash"]):
+        # Any write to the session re-issues the session cookie
+        if request.session.get("user") != username:
+            request.session["user"] = username
+        return REDIRECT_DIRECTORY
     else:
-        return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+        return HTMLResponse(LOGIN_ERROR_HTML)
 
 @app.get("/logout")
 async def logout(request: Request):
-    request.session.clear()
-    return RedirectResponse(url="/login", status_code=303)
+    if request.session:
+        request.session.clear()
+    return REDIRECT_LOGIN
 
 @app.get("/directory", response_class=HTMLResponse)
-async def directory(request: Request, q: Optional[str] = None, db: Session = Depends(get_db)):
-    user = get_current_user(request)
-    if not user:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    query = db.query(Employee)
-    if q:
-        search = f"%{q}%"
-        query = query.filter(
-            (Employee.name.ilike(search)) |
-            (Employee.department.ilike(search)) |
-            (Employee.job_title.ilike(search))
+async def directory(
+    request: Request,
+    q: Optional[str] = None,
+    # Bounded so OFFSET and the id cursor fit in a signed 64-bit SQLite INTEGER
+    page: int = Query(1, ge=1, le=2**63 // 200),
+    after: Optional[int] = Query(None, ge=0, le=2**63 - 1),
+    page_size: int = Query(50, ge=1, le=200),
+    user: dict = Depends(require_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # The page only changes when employees are added, the app is redeployed,
+    # or for a different viewer/query, so let the browser revalidate with an ETag
+    fingerprint = (
+        f"{APP_VERSION}:{directory_version}:{user['name']}:{user['role']}:"
+        f"{q}:{page}:{after}:{page_size}"
+    )
+    etag = f'W/"{hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=cache_headers)
+
+    # One extra row tells us whether there is a next page
+    limit = page_size + 1
+    match = fts_query(q) if q else None
+    if match:
+        # Ranked search results page by offset, since rank order has no key
+        result = await db.execute(
+            FTS_SEARCH, {"q": match, "limit": limit, "offset": (page - 1) * page_size}
         )
-    
-    employees = query.all()
-    return templates.TemplateResponse("directory.html", {
-        "request": request, 
-        "employees": employees, 
-        "user": user, 
-        "q": q
-    })
+        employees = result.all()
+    else:
+        # Plain listing pages by id (keyset), which stays cheap on deep pages
+        query = select(*LISTING_COLUMNS).order_by(Employee.id).limit(limit)
+        if after is not None:
+            query = query.where(Employee.id > after)
+        if q:
+            # No searchable tokens for FTS5, fall back to a substring match
+            query = query.where(Employee.search_blob.contains(q.lower(), autoescape=True))
+        result = await db.execute(query)
+        employees = result.all()
+
+    next_url = None
+    if len(employees) > page_size:
+        employees = employees[:page_size]
+        params = {"q": q} if q else {}
+        if match:
+            params["page"] = page + 1
+        else:
+            params["after"] = employees[-1].id
+        params["page_size"] = page_size
+        next_url = "/directory?" + urlencode(params)
+
+    # Pages are capped at 200 rows, so render in one go: streaming the
+    # template's many small chunks through the threadpool is far slower
+    html = templates.get_template("directory.html").render(
+        request=request,
+        employees=employees,
+        user=user,
+        q=q,
+        next_url=next_url,
+    )
+    return HTMLResponse(html, headers=cache_headers)
 
 @app.get("/add-employee", response_class=HTMLResponse)
-async def add_employee_page(request: Request):
-    user = get_current_user(request)
-    if not user or user["role"] != "admin":
-        return RedirectResponse(url="/directory", status_code=303)
-    
+async def add_employee_page(request: Request, user: dict = Depends(require_admin)):
     return templates.TemplateResponse("add_employee.html", {"request": request, "user": user})
 
 @app.post("/add-employee", response_class=HTMLResponse)
@@ -152,35 +268,34 @@ async def add_employee(
     email: str = Form(...),
     phone: str = Form(...),
     job_title: str = Form(...),
-    db: Session = Depends(get_db)
+    user: dict = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user(request)
-    if not user or user["role"] != "admin":
-        return RedirectResponse(url="/directory", status_code=303)
-    
-    new_employee = Employee(
-        name=name,
-        department=department,
-        email=email,
-        phone=phone,
-        job_title=job_title
+    # A duplicate email inserts nothing instead of raising IntegrityError
+    result = await db.execute(
+        sqlite_insert(Employee).values(
+            name=name,
+            department=department,
+            email=email,
+            phone=phone,
+            job_title=job_title
+        ).on_conflict_do_nothing(index_elements=[Employee.email])
     )
-    db.add(new_employee)
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
+    await db.commit()
+    if result.rowcount == 0:
         return templates.TemplateResponse("add_employee.html", {
             "request": request, 
             "user": user, 
-            "error": "Error adding employee. Email might already exist."
+            "error": "Error adding employee. Email already exists."
         })
-        
-    return RedirectResponse(url="/directory", status_code=303)
+
+    global directory_version
+    directory_version += 1
+    return REDIRECT_DIRECTORY
 
 @app.get("/health")
 async def health():
-    return JSONResponse(content={"status": "ok"})
+    return {"status": "ok"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from typing import Optional
+import secrets
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class Session(dict):
+    """Session dict that records whether it was written to.
+
+    Any write counts, even one that stores an equal value, so callers
+    should skip assignments that would not change anything.
+    """
+
+    modified = False
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def pop(self, *args):
+        self.modified = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+
+class SessionStore:
+    """In-memory session store, evicting the least recently used entry when full.
+
+    Sessions live in the process, so this only works with a single worker.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+    def get(self, sid: str) -> Optional[dict]:
+        entry = self._data.get(sid)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.time():
+            del self._data[sid]
+            return None
+        self._data.move_to_end(sid)
+        return data
+
+    def set(self, sid: str, data: dict, max_age: int):
+        self._data[sid] = (time.time() + max_age, data)
+        self._data.move_to_end(sid)
+        if len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, sid: str):
+        self._data.pop(sid, None)
+
+
+class ServerSessionMiddleware:
+    """Keeps `request.session` server-side; the cookie only carries a random id.
+
+    Loading a session is a dict lookup instead of decoding and HMAC-verifying
+    a signed cookie. Nothing is stored or sent unless the session was written
+    to, and the id is then rotated so an id planted before login never
+    becomes authenticated.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: Optional[SessionStore] = None,
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,  # 14 days, in seconds
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+    ):
+        self.app = app
+        self.store = store if store is not None else SessionStore()
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.security_flags = f"httponly; samesite={same_site}"
+        if https_only:
+            self.security_flags += "; secure"
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        sid = HTTPConnection(scope).cookies.get(self.session_cookie)
+        loaded = self.store.get(sid) if sid else None
+        if loaded is None:
+            sid = None
+            loaded = {}
+        scope["session"] = Session(loaded)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                if session.modified:
+                    headers = MutableHeaders(scope=message)
+                    if sid is not None:
+                        self.store.delete(sid)
+                    if session:
+                        new_sid = secrets.token_urlsafe(16)
+                        self.store.set(new_sid, dict(session), self.max_age)
+                        headers.append("Set-Cookie", self._cookie(new_sid, self.max_age))
+                    elif sid is not None:
+                        headers.append("Set-Cookie", self._cookie("null", 0))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        expires = "; expires=Thu, 01 Jan 1970 00:00:00 GMT" if max_age == 0 else ""
+        return (
+            f"{self.session_cookie}={value}; path={self.path}; "
+            f"Max-Age={max_age}{expires}; {self.security_flags}"
+        )